@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试脚本 - 使用本地生成的订阅内容测量各协议的解析吞吐
+"""
+
+import sys
+import os
+import json
+import time
+import base64
+import random
+from urllib.parse import quote
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import ProxyConverter
+from rich.console import Console
+from rich.panel import Panel
+
+console = Console()
+
+def make_uri(scheme: str, index: int) -> str:
+    """生成指定协议的示例 URI"""
+    server = f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+    name = quote(f"香港 {scheme} {index:05d}")
+
+    if scheme == 'ss':
+        auth = base64.b64encode(f"aes-256-gcm:pass{index}@{server}:8388".encode()).decode()
+        return f"ss://{auth}#{name}"
+    elif scheme == 'vmess':
+        config = {'v': '2', 'ps': f"香港 vmess {index:05d}", 'add': server, 'port': '443',
+                  'id': 'b831381d-6324-4d53-ad4f-8cda48b30811', 'aid': '0', 'net': 'ws',
+                  'path': '/ws', 'host': 'example.com', 'tls': 'tls'}
+        return f"vmess://{base64.b64encode(json.dumps(config).encode()).decode()}"
+    elif scheme == 'trojan':
+        return f"trojan://pass{index}@{server}:443?sni=example.com&type=ws&path=%2Fws#{name}"
+    elif scheme == 'vless':
+        return (f"vless://b831381d-6324-4d53-ad4f-8cda48b30811@{server}:443"
+                f"?encryption=none&security=tls&sni=example.com&type=grpc&serviceName=grpc#{name}")
+    raise ValueError(scheme)
+
+def check_batch_isolation(converter: ProxyConverter) -> bool:
+    """校验批量解析与逐行解析结果一致，坏行不会影响相邻行"""
+    def vmess(payload: str) -> str:
+        return f"vmess://{base64.b64encode(payload.encode()).decode()}"
+
+    valid = json.dumps({'ps': 'c', 'add': 'example.com', 'port': '443', 'id': 'b831381d-6324-4d53-ad4f-8cda48b30811'})
+    # 前两行合起来是一个数组元素、第四行含两个元素，拼接成整体数组时总数不变但位置错位
+    uris = [
+        vmess('[{"ps": "a", "add": "h", "port": "1"}'),
+        vmess('{"ps": "b", "add": "h", "port": "1"}]'),
+        vmess(valid),
+        vmess('{"ps": "d", "add": "h", "port": "1"}, {"ps": "e", "add": "h", "port": "1"}'),
+        'vmess://not-base64!',
+        vmess(valid.replace('"c"', '"f"')),
+    ]
+
+    with console.capture():
+        expected = [converter.parse_vmess_uri(uri) for uri in uris]
+        actual = converter.parse_vmess_batch(uris)
+    return actual == expected and [node and node['name'] for node in actual] == [None, None, 'c', None, None, 'f']
+
+def main():
+    """主基准测试函数"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    schemes = ['ss', 'vmess', 'trojan', 'vless']
+
+    console.print(Panel(
+        "[bold blue]Hulink 解析基准测试[/bold blue]\n"
+        f"[dim]每种协议 {count} 行，协议交错排列，Base64 编码[/dim]",
+        border_style="blue"
+    ))
+
+    random.seed(0)
+    lines = [make_uri(scheme, i) for i in range(count) for scheme in schemes]
+    content = base64.b64encode('\n'.join(lines).encode()).decode()
+
+    converter = ProxyConverter()
+    if check_batch_isolation(converter):
+        console.print("[green]✅ VMess 批量解析与逐行解析结果一致，坏行不影响相邻行[/green]")
+    else:
+        console.print("[red]❌ VMess 批量解析结果与逐行解析不一致[/red]")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    nodes = converter.parse_subscription_content(content)
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    clash_config = converter.convert_to_clash(nodes)
+    render_seconds = time.perf_counter() - start
+
+    console.print(f"\n[bold yellow]解析总耗时: {parse_seconds * 1000:.1f} ms ({len(lines) / parse_seconds:,.0f} 行/秒)[/bold yellow]")
+    console.print(f"[bold yellow]Clash 渲染耗时: {render_seconds * 1000:.1f} ms ({len(clash_config)} 字符)[/bold yellow]")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        console.print("\n\n[bold red]基准测试被用户中断[/bold red]")
@@ -6,9 +6,21 @@ Hulink - 代理节点订阅链接转换工具
 """
 
 import os
+import re
 import sys
 import json
 import base64
+import io
+import socket
+import struct
+import bisect
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import hashlib
+import tempfile
+import functools
+import tracemalloc
 import yaml
 import requests
 from urllib.parse import urlparse, parse_qs, unquote
@@ -18,14 +30,729 @@ from rich.table import Table
 from rich.prompt import Prompt, Confirm
 from rich.text import Text
 from rich import print as rprint
-from typing import Dict, List, Any, Optional
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple
 
 console = Console()
 
+# 渲染结果格式版本，参与转换缓存键计算；修改任何 convert_to_* 的输出时需递增，
+# 使升级前写入的磁盘缓存失效
+RENDER_VERSION = 1
+
+# 节点上仅供内部使用的字段，不写入输出配置
+INTERNAL_NODE_KEYS = ('provider', 'resolved_ips')
+
+# 地区关键字 (按节点名称粗略判断所属地区)
+REGION_KEYWORDS = {
+    'HK': ['香港', '港', 'HK', 'Hong Kong', 'HongKong', '🇭🇰'],
+    'TW': ['台湾', '台灣', 'TW', 'Taiwan', '🇹🇼'],
+    'JP': ['日本', '东京', '大阪', 'JP', 'Japan', 'Tokyo', 'Osaka', '🇯🇵'],
+    'SG': ['新加坡', '狮城', 'SG', 'Singapore', '🇸🇬'],
+    'KR': ['韩国', '首尔', 'KR', 'Korea', 'Seoul', '🇰🇷'],
+    'US': ['美国', '洛杉矶', '硅谷', 'US', 'USA', 'United States', 'Los Angeles', '🇺🇸'],
+    'GB': ['英国', '伦敦', 'UK', 'GB', 'United Kingdom', 'London', '🇬🇧'],
+    'DE': ['德国', '法兰克福', 'DE', 'Germany', 'Frankfurt', '🇩🇪'],
+    'CN': ['中国', '回国', 'CN', 'China', '🇨🇳'],
+}
+
+_REGION_PATTERNS = [
+    (region, re.compile('|'.join(
+        # 英文关键字按单词边界匹配，避免 "US" 命中 "BONUS"
+        rf"(?<![A-Za-z]){re.escape(keyword)}(?![A-Za-z])" if keyword.isascii() else re.escape(keyword)
+        for keyword in keywords
+    ), re.IGNORECASE))
+    for region, keywords in REGION_KEYWORDS.items()
+]
+
+# 地区分组显示名称
+REGION_NAMES = {
+    'HK': '🇭🇰 香港', 'TW': '🇹🇼 台湾', 'JP': '🇯🇵 日本', 'SG': '🇸🇬 新加坡', 'KR': '🇰🇷 韩国',
+    'US': '🇺🇸 美国', 'GB': '🇬🇧 英国', 'DE': '🇩🇪 德国', 'CN': '🇨🇳 中国', 'OTHER': '🌐 其他',
+}
+
+def guess_region(name: str) -> str:
+    """根据节点名称关键字猜测地区代码，无法识别时返回 OTHER"""
+    for region, pattern in _REGION_PATTERNS:
+        if pattern.search(name):
+            return region
+    return 'OTHER'
+
+class RegionIndex:
+    """本地 IP 段地区索引
+    
+    IP 段数据按起始地址排序后存入紧凑数组，查询时二分查找；
+    IP 无法命中时按节点名称关键字判断。全部在本地完成，不访问网络。
+    
+    数据文件每行一条记录，支持两种写法 (# 开头为注释):
+        1.0.1.0,1.0.3.255,CN
+        1.0.8.0/21,CN
+    
+    嵌套或重叠的 IP 段在加载时展开为互不重叠的区间，重叠部分以起始地址更大
+    (起始相同时范围更小) 的记录为准，即更具体的段优先。
+    """
+    
+    def __init__(self):
+        self._v4_starts = array('I')
+        self._v4_ends = array('I')
+        self._v4_codes = array('H')
+        self._v6_starts: List[int] = []
+        self._v6_ends: List[int] = []
+        self._v6_codes = array('H')
+        self._regions: List[str] = []
+        self._ip_cache: Dict[str, Optional[str]] = {}
+        self.fingerprint = ''
+    
+    @classmethod
+    def load(cls, path: str) -> 'RegionIndex':
+        """从本地文件加载 IP 段数据"""
+        import ipaddress
+        
+        index = cls()
+        region_ids: Dict[str, int] = {}
+        v4_ranges = []
+        v6_ranges = []
+        digest = hashlib.sha256()
+        
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                digest.update(line.encode('utf-8'))
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                
+                parts = [part.strip() for part in line.split(',')]
+                try:
+                    if len(parts) == 2:
+                        network = ipaddress.ip_network(parts[0], strict=False)
+                        start, end = network.network_address, network.broadcast_address
+                    else:
+                        start, end = ipaddress.ip_address(parts[0]), ipaddress.ip_address(parts[1])
+                    region = parts[-1].upper()
+                except (ValueError, IndexError) as e:
+                    console.print(f"[yellow]跳过地区数据第 {line_no} 行: {e}[/yellow]")
+                    continue
+                
+                if region not in region_ids:
+                    region_ids[region] = len(index._regions)
+                    index._regions.append(region)
+                
+                ranges = v4_ranges if start.version == 4 else v6_ranges
+                ranges.append((int(start), int(end), region_ids[region]))
+        
+        v4_ranges, v4_overlaps = cls._flatten_ranges(v4_ranges)
+        v6_ranges, v6_overlaps = cls._flatten_ranges(v6_ranges)
+        if v4_overlaps or v6_overlaps:
+            console.print(f"[yellow]地区数据中有 {v4_overlaps + v6_overlaps} 个 IP 段与其他段重叠，"
+                          f"已按更具体的段优先展开[/yellow]")
+        
+        for start, end, code in v4_ranges:
+            index._v4_starts.append(start)
+            index._v4_ends.append(end)
+            index._v4_codes.append(code)
+        for start, end, code in v6_ranges:
+            index._v6_starts.append(start)
+            index._v6_ends.append(end)
+            index._v6_codes.append(code)
+        
+        index.fingerprint = digest.hexdigest()
+        console.print(f"[dim]已加载地区数据: {len(v4_ranges)} 个 IPv4 段, {len(v6_ranges)} 个 IPv6 段[/dim]")
+        return index
+    
+    @staticmethod
+    def _flatten_ranges(ranges: List[Tuple[int, int, int]]) -> Tuple[List[Tuple[int, int, int]], int]:
+        """将可能嵌套/重叠的 IP 段展开为按起始地址排序、互不重叠的区间
+        
+        返回 (区间列表, 与其他段重叠的记录数)。
+        """
+        flat: List[Tuple[int, int, int]] = []
+        
+        def emit(start: int, end: int, code: int):
+            # 相邻且地区相同的区间合并
+            if flat and flat[-1][2] == code and flat[-1][1] + 1 == start:
+                flat[-1] = (flat[-1][0], end, code)
+            else:
+                flat.append((start, end, code))
+        
+        def flush(stack: List[Tuple[int, int]], pos: int, limit: Optional[int]) -> int:
+            # 输出 [pos, limit) 范围内由栈顶 (最具体的段) 决定的区间
+            while stack and (limit is None or pos < limit):
+                end, code = stack[-1]
+                if end < pos:
+                    stack.pop()
+                    continue
+                segment_end = end if limit is None else min(end, limit - 1)
+                emit(pos, segment_end, code)
+                pos = segment_end + 1
+                if end <= segment_end:
+                    stack.pop()
+            return pos
+        
+        overlaps = 0
+        stack: List[Tuple[int, int]] = []
+        pos = 0
+        # 起始相同时范围大的在前，使更小的段后入栈、优先生效
+        for start, end, code in sorted(ranges, key=lambda r: (r[0], -r[1])):
+            pos = flush(stack, pos, start)
+            if any(open_end >= start for open_end, _ in stack):
+                overlaps += 1
+            if not stack:
+                pos = start
+            stack.append((end, code))
+        flush(stack, pos, None)
+        return flat, overlaps
+    
+    def __len__(self) -> int:
+        return len(self._v4_starts) + len(self._v6_starts)
+    
+    def lookup_ip(self, ip: str) -> Optional[str]:
+        """查询 IP 所属地区，非 IP 或未命中时返回 None"""
+        if ip in self._ip_cache:
+            return self._ip_cache[ip]
+        
+        region = None
+        try:
+            value = struct.unpack('!I', socket.inet_pton(socket.AF_INET, ip))[0]
+            starts, ends, codes = self._v4_starts, self._v4_ends, self._v4_codes
+        except OSError:
+            try:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), 'big')
+                starts, ends, codes = self._v6_starts, self._v6_ends, self._v6_codes
+            except OSError:
+                starts = None
+        
+        if starts:
+            i = bisect.bisect_right(starts, value) - 1
+            if i >= 0 and value <= ends[i]:
+                region = self._regions[codes[i]]
+        
+        self._ip_cache[ip] = region
+        return region
+    
+    def classify(self, node: Dict[str, Any]) -> str:
+        """判断节点所属地区: 先查服务器 IP (含 DNS 解析结果)，再按名称关键字"""
+        if len(self):
+            region = self.lookup_ip(str(node.get('server', '')))
+            if region:
+                return region
+            for ip in node.get('resolved_ips') or []:
+                region = self.lookup_ip(ip)
+                if region:
+                    return region
+        return guess_region(str(node.get('name', '')))
+
+class DNSResolver:
+    """节点域名批量解析
+    
+    对节点列表中去重后的 server 域名用有限大小的线程池并发解析，
+    结果按 TTL 缓存，同一域名在缓存有效期内只解析一次。
+    resolve_func 可替换为自定义解析函数 (host -> IP 列表)，便于离线测试。
+    """
+    
+    def __init__(self, max_workers: int = 16, ttl: float = 300, timeout: float = 10,
+                 resolve_func=None, clock=time.monotonic):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.timeout = timeout
+        self.resolve_func = resolve_func or self.system_resolve
+        self.clock = clock
+        self._cache: Dict[str, Tuple[float, List[str]]] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.cache_hits = 0
+        self.failures = 0
+        # 超时的域名单独计数；超时后查询线程仍可能完成并计入 lookups/failures
+        self.timeouts = 0
+    
+    @staticmethod
+    def system_resolve(host: str) -> List[str]:
+        """使用系统解析器查询域名的全部地址"""
+        infos = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)
+        return list(dict.fromkeys(info[4][0] for info in infos))
+    
+    @staticmethod
+    def is_ip(host: str) -> bool:
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                socket.inet_pton(family, host)
+                return True
+            except (OSError, ValueError):
+                pass
+        return False
+    
+    def _lookup(self, host: str) -> List[str]:
+        try:
+            ips = list(self.resolve_func(host))
+        except Exception:
+            ips = []
+        with self._lock:
+            self.lookups += 1
+            if not ips:
+                self.failures += 1
+            # 解析失败也缓存，避免同一轮内对坏域名重复查询
+            self._cache[host] = (self.clock() + self.ttl, ips)
+        return ips
+    
+    def resolve_hosts(self, hosts) -> Dict[str, List[str]]:
+        """批量解析域名，返回 {域名: IP 列表}，失败或超时的域名为空列表"""
+        results: Dict[str, List[str]] = {}
+        pending = []
+        now = self.clock()
+        
+        for host in dict.fromkeys(hosts):
+            if not host or not isinstance(host, str):
+                continue
+            if self.is_ip(host):
+                results[host] = [host]
+                continue
+            cached = self._cache.get(host)
+            if cached and cached[0] > now:
+                results[host] = cached[1]
+                self.cache_hits += 1
+            else:
+                pending.append(host)
+        
+        if pending:
+            executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)))
+            try:
+                futures = {executor.submit(self._lookup, host): host for host in pending}
+                done, not_done = wait(futures, timeout=self.timeout)
+                for future in done:
+                    results[futures[future]] = future.result()
+                for future in not_done:
+                    future.cancel()
+                    results[futures[future]] = []
+                with self._lock:
+                    self.timeouts += len(not_done)
+            finally:
+                executor.shutdown(wait=False)
+        
+        return results
+    
+    @staticmethod
+    def _node_host(node: Dict[str, Any]) -> str:
+        # 缺失或非字符串的 server (如没有 add 字段的 vmess 节点) 不参与解析
+        server = node.get('server')
+        return server.strip() if isinstance(server, str) else ''
+    
+    def resolve_nodes(self, nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """解析节点 server 并写入 resolved_ips 字段"""
+        resolved = self.resolve_hosts(self._node_host(node) for node in nodes)
+        for node in nodes:
+            node['resolved_ips'] = resolved.get(self._node_host(node), [])
+        return nodes
+
+class OutputCache:
+    """转换结果缓存 (按节点内容摘要寻址)
+    
+    内存层按条目数和总字节数 (UTF-8) 做 LRU 淘汰，超过 max_bytes 的单个结果不进入内存层；
+    磁盘层总大小超过 max_disk_bytes 时按最近访问时间删除最旧的文件。
+    """
+    
+    def __init__(self, max_entries: int = 64, cache_dir: Optional[str] = None,
+                 max_bytes: int = 32 * 1024 * 1024, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(nodes: List[Dict[str, Any]], target: str, **options) -> str:
+        """根据节点列表、目标格式和选项生成稳定摘要"""
+        payload = json.dumps(
+            {'version': RENDER_VERSION, 'target': target, 'options': options, 'nodes': nodes},
+            sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.out")
+    
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，内存未命中时回退到磁盘"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+        
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = f.read()
+                # 更新访问时间，供磁盘淘汰使用
+                os.utime(path, None)
+                self._store(key, value)
+                self.hits += 1
+                return value
+            except OSError:
+                pass
+        
+        self.misses += 1
+        return None
+    
+    def put(self, key: str, value: str):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._store(key, value)
+        if self.cache_dir:
+            try:
+                # 每个写入方使用独立的临时文件再原子替换，避免并发读写到半个文件
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{key}.", suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write(value)
+                    os.replace(tmp_path, self._disk_path(key))
+                except OSError:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+                self._evict_disk()
+            except OSError as e:
+                console.print(f"[yellow]写入磁盘缓存失败: {e}[/yellow]")
+    
+    def _store(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._bytes -= self._entries.popitem(last=False)[1][1]
+    
+    # 超过该时长 (秒) 仍未被替换的临时文件视为异常退出遗留
+    STALE_TMP_SECONDS = 3600
+    
+    def _evict_disk(self):
+        """磁盘缓存超出容量时删除最久未访问的文件，并清理遗留的临时文件"""
+        files = []
+        total = 0
+        stale_before = time.time() - self.STALE_TMP_SECONDS
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if entry.name.endswith('.tmp') and stat.st_mtime < stale_before:
+                    os.remove(entry.path)
+                    continue
+            except OSError:
+                continue
+            if entry.name.endswith(('.out', '.tmp')):
+                # 进行中的临时文件也占用空间，计入总量但不作为淘汰对象
+                total += stat.st_size
+                if entry.name.endswith('.out'):
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    
+    def clear(self):
+        """清空内存缓存 (磁盘文件保留)"""
+        self._entries.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+class MemoryBudgetExceeded(Exception):
+    """内存使用超出预算"""
+
+def current_rss() -> Optional[int]:
+    """当前进程常驻内存 (字节)，无法获取时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # 非 Linux 平台退回到历史峰值 (macOS 单位为字节，其余为 KB)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+class MemoryMonitor:
+    """分阶段内存统计和内存预算保护
+    
+    enabled 为 True 时使用 tracemalloc 和 RSS 采样统计每个阶段的峰值；
+    budget_mb 设置后在各阶段检查内存，超出预算时按 on_exceed 处理:
+    'abort' 直接抛出 MemoryBudgetExceeded，'stream' 让支持的阶段切换到流式路径。
+    """
+    
+    def __init__(self, enabled: bool = False, budget_mb: Optional[float] = None, on_exceed: str = 'abort'):
+        if on_exceed not in ('abort', 'stream'):
+            raise ValueError(f"不支持的超预算处理方式: {on_exceed}")
+        self.enabled = enabled
+        self.budget_bytes = int(budget_mb * 1024 * 1024) if budget_mb else None
+        self.on_exceed = on_exceed
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._stack: List[Dict[str, Any]] = []
+        self._started_tracing = False
+    
+    @contextmanager
+    def stage(self, name: str):
+        """统计一个阶段的内存峰值，可嵌套"""
+        if not self.enabled:
+            yield
+            return
+        
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self._stack:
+            # 重置峰值前先把外层阶段到目前为止的峰值保存下来
+            parent = self._stack[-1]
+            parent['traced_peak'] = max(parent['traced_peak'], tracemalloc.get_traced_memory()[1])
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        
+        frame = {'traced_peak': 0, 'rss_peak': current_rss() or 0}
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            traced_peak = max(tracemalloc.get_traced_memory()[1], frame['traced_peak'])
+            rss_peak = max(current_rss() or 0, frame['rss_peak'])
+            
+            # 内层阶段重置了 tracemalloc 峰值，需要把结果并入外层
+            if self._stack:
+                parent = self._stack[-1]
+                parent['traced_peak'] = max(parent['traced_peak'], traced_peak)
+                parent['rss_peak'] = max(parent['rss_peak'], rss_peak)
+            elif self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+            
+            stat = self.stats.setdefault(name, {'calls': 0, 'traced_peak': 0, 'rss_peak': 0})
+            stat['calls'] += 1
+            stat['traced_peak'] = max(stat['traced_peak'], traced_peak)
+            stat['rss_peak'] = max(stat['rss_peak'], rss_peak)
+    
+    def check(self, stage: str, can_stream: bool = False, extra_bytes: int = 0) -> bool:
+        """检查内存预算
+        
+        extra_bytes 为调用方预计还要分配的内存。返回 True 表示应切换到流式路径；
+        超出预算且无法流式处理时抛出 MemoryBudgetExceeded。
+        """
+        if self.budget_bytes is None:
+            return False
+        
+        usage = current_rss()
+        if usage is None:
+            usage = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        if self._stack:
+            self._stack[-1]['rss_peak'] = max(self._stack[-1]['rss_peak'], usage)
+        
+        if usage + extra_bytes <= self.budget_bytes:
+            return False
+        
+        message = (f"{stage} 阶段预计内存 {(usage + extra_bytes) / 1048576:.1f} MB "
+                   f"超出预算 {self.budget_bytes / 1048576:.1f} MB")
+        if self.on_exceed == 'stream' and can_stream:
+            console.print(f"[yellow]{message}，切换到流式处理[/yellow]")
+            return True
+        raise MemoryBudgetExceeded(message)
+    
+    def report(self):
+        """输出各阶段内存峰值"""
+        if not self.stats:
+            return
+        
+        table = Table(show_header=True, header_style="bold magenta", title="内存使用统计")
+        table.add_column("阶段")
+        table.add_column("调用次数", justify="right")
+        table.add_column("tracemalloc 峰值 (MB)", justify="right")
+        table.add_column("RSS 峰值 (MB)", justify="right")
+        
+        for name, stat in self.stats.items():
+            table.add_row(
+                name,
+                str(stat['calls']),
+                f"{stat['traced_peak'] / 1048576:.2f}",
+                f"{stat['rss_peak'] / 1048576:.2f}"
+            )
+        
+        console.print(table)
+
+def memory_stage(name: str):
+    """将 ProxyConverter 方法标记为一个内存统计阶段"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.memory.stage(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class NameFilter:
+    """节点名称过滤和重命名规则
+    
+    include/exclude/rename 规则均为正则表达式，每类规则在构造时合并编译为一个
+    带命名分组的正则，匹配时通过 lastgroup 定位命中的规则并累计命中次数。
+    exclude 优先于 include；设置了 include 时只保留至少命中一条的节点。
+    rename 为 (pattern, replacement) 列表，对命中的片段按对应规则替换。
+    
+    规则开头的全局标志 (如 "(?i)") 会转换为只作用于该规则的 "(?i:...)"；
+    由于多条规则合并后分组编号会变化，规则中不支持编号反向引用 (\\1)，
+    请改用命名分组 (?P<name>...) 和 (?P=name)。flags 作用于全部规则。
+    """
+    
+    # 机场常见的流量/到期信息节点
+    INFO_PATTERNS = ['剩余流量', '到期', '过期时间', '套餐', '官网', '流量重置']
+    
+    _INLINE_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+    _NUMBERED_BACKREF = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]')
+    
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 rename: Optional[List[Tuple[str, str]]] = None, flags: int = 0):
+        self.flags = flags
+        self.include_rules = list(include or [])
+        self.exclude_rules = list(exclude or [])
+        self.rename_rules = [pattern for pattern, _ in (rename or [])]
+        
+        self._include = self._combine('include', self.include_rules)
+        self._exclude = self._combine('exclude', self.exclude_rules)
+        self._rename = self._combine('rename', self.rename_rules)
+        self._renamers = [(re.compile(pattern, flags), repl) for pattern, repl in (rename or [])]
+        
+        self.hits: Dict[str, int] = OrderedDict()
+        for kind, rules in (('exclude', self.exclude_rules), ('include', self.include_rules),
+                            ('rename', self.rename_rules)):
+            for rule in rules:
+                self.hits[f"{kind}: {rule}"] = 0
+        self.rejected = 0
+    
+    def _prepare(self, kind: str, pattern: str) -> str:
+        """单独校验一条规则，并转换为可以安全合并的形式"""
+        try:
+            re.compile(pattern, self.flags)
+        except re.error as e:
+            raise ValueError(f"{kind} 规则 {pattern!r} 不是有效的正则表达式: {e}")
+        if self._NUMBERED_BACKREF.search(pattern):
+            raise ValueError(f"{kind} 规则 {pattern!r} 使用了编号反向引用，请改用 (?P<name>...) 和 (?P=name)")
+        
+        match = self._INLINE_FLAGS.match(pattern)
+        if match:
+            pattern = f"(?{match.group(1)}:{pattern[match.end():]})"
+        return pattern
+    
+    def _combine(self, kind: str, patterns: List[str]):
+        if not patterns:
+            return None
+        combined = '|'.join(f"(?P<_r{i}>{self._prepare(kind, pattern)})" for i, pattern in enumerate(patterns))
+        try:
+            return re.compile(combined, self.flags)
+        except re.error as e:
+            raise ValueError(f"{kind} 规则无法合并 (命名分组可能重名): {e}")
+    
+    def _hit(self, kind: str, rules: List[str], match) -> int:
+        index = int(match.lastgroup[2:])
+        self.hits[f"{kind}: {rules[index]}"] += 1
+        return index
+    
+    def accepts(self, name: str) -> bool:
+        """判断节点名称是否保留"""
+        if self._exclude is not None:
+            match = self._exclude.search(name)
+            if match:
+                self._hit('exclude', self.exclude_rules, match)
+                self.rejected += 1
+                return False
+        
+        if self._include is not None:
+            match = self._include.search(name)
+            if not match:
+                self.rejected += 1
+                return False
+            self._hit('include', self.include_rules, match)
+        
+        return True
+    
+    def rename(self, name: str) -> str:
+        """按重命名规则处理节点名称"""
+        if self._rename is None:
+            return name
+        
+        def replace(match):
+            pattern, repl = self._renamers[self._hit('rename', self.rename_rules, match)]
+            # 在原字符串的同一位置重新匹配，保留前后文供 lookbehind/lookahead 使用
+            rule_match = pattern.match(name, match.start())
+            return rule_match.expand(repl) if rule_match else match.group(0)
+        
+        return self._rename.sub(replace, name).strip()
+    
+    def rename_nodes(self, nodes: List[Dict[str, Any]]):
+        """按顺序重命名节点，重命名后与其他节点重名时追加数字后缀 (Clash 不允许重名)"""
+        renamed = [(node, self.rename(str(node.get('name', '')))) for node in nodes]
+        # 未被改名的节点保留原名，改名结果需要避开它们
+        used = {new_name for node, new_name in renamed if new_name == node.get('name')}
+        
+        for node, new_name in renamed:
+            if new_name != node.get('name'):
+                base_name = new_name
+                suffix = 2
+                while new_name in used:
+                    new_name = f"{base_name} {suffix}"
+                    suffix += 1
+                used.add(new_name)
+                node['name'] = new_name
+    
+    def report(self):
+        """输出各规则命中次数"""
+        table = Table(show_header=True, header_style="bold magenta", title=f"名称规则命中统计 (过滤 {self.rejected} 个节点)")
+        table.add_column("规则")
+        table.add_column("命中次数", justify="right")
+        
+        for rule, count in self.hits.items():
+            table.add_row(rule, str(count))
+        
+        console.print(table)
+
 class ProxyConverter:
     """代理协议转换器"""
     
-    def __init__(self):
+    # 预估 yaml.dump 渲染单个 Clash 节点所需的内存，用于提前判断是否需要流式输出
+    CLASH_BYTES_PER_NODE = 4096
+    # 流式输出时每批渲染的节点数
+    CLASH_STREAM_CHUNK = 500
+    # 解析时每批解码的 URI 行数
+    PARSE_CHUNK = 1000
+    
+    def __init__(self, cache_size: int = 64, cache_dir: Optional[str] = None,
+                 memory_profile: bool = False, memory_budget_mb: Optional[float] = None,
+                 memory_on_exceed: str = 'abort', name_filter: Optional[NameFilter] = None,
+                 region_db: Optional[str] = None, resolver: Optional[DNSResolver] = None):
+        self.name_filter = name_filter
+        self.resolver = resolver or DNSResolver()
+        self.scheme_parsers: Dict[str, Dict[str, Any]] = {}
+        self.scheme_stats: Dict[str, Dict[str, Any]] = {}
+        self.register_scheme_parser('ss', self.parse_shadowsocks_uri, 'SS', format_name='shadowsocks')
+        self.register_scheme_parser('vmess', self.parse_vmess_batch, 'VMess', batch=True, format_name='v2ray_uri')
+        self.register_scheme_parser('trojan', self.parse_trojan_uri, 'Trojan')
+        self.register_scheme_parser('vless', self.parse_vless_uri, 'VLESS')
+        self.region_index = RegionIndex.load(region_db) if region_db else RegionIndex()
+        self.output_cache = OutputCache(max_entries=cache_size, cache_dir=cache_dir)
+        self.memory = MemoryMonitor(enabled=memory_profile, budget_mb=memory_budget_mb, on_exceed=memory_on_exceed)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -41,6 +768,7 @@ class ProxyConverter:
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     
+    @memory_stage('fetch_subscription')
     def fetch_subscription(self, url: str) -> str:
         """获取订阅内容"""
         max_retries = 3
@@ -87,25 +815,33 @@ class ProxyConverter:
                     session.headers.update(method['headers'])
                     session.verify = False
                     
-                    response = session.get(
+                    # 延迟读取响应体，以便在下载前按 Content-Length 检查内存预算
+                    with session.get(
                         url, 
                         timeout=60,
                         allow_redirects=True,
-                        stream=False
-                    )
-                    
-                    console.print(f"[dim]  响应状态码: {response.status_code}[/dim]")
-                    console.print(f"[dim]  响应头: {dict(list(response.headers.items())[:3])}[/dim]")
-                    
-                    response.raise_for_status()
-                    
-                    # 检查响应内容
-                    if not response.text.strip():
-                        raise Exception("响应内容为空")
-                    
-                    console.print(f"[green]✅ 成功获取内容，长度: {len(response.text)} 字符[/green]")
-                    return response.text
+                        stream=True
+                    ) as response:
+                        console.print(f"[dim]  响应状态码: {response.status_code}[/dim]")
+                        console.print(f"[dim]  响应头: {dict(list(response.headers.items())[:3])}[/dim]")
+                        
+                        response.raise_for_status()
+                        
+                        content_length = response.headers.get('Content-Length', '')
+                        if content_length.isdigit():
+                            # 响应文本解码后约占原始大小的数倍，按 4 倍估算
+                            self.memory.check('fetch_subscription', extra_bytes=int(content_length) * 4)
+                        
+                        # 检查响应内容
+                        if not response.text.strip():
+                            raise Exception("响应内容为空")
+                        
+                        console.print(f"[green]✅ 成功获取内容，长度: {len(response.text)} 字符[/green]")
+                        self.memory.check('fetch_subscription')
+                        return response.text
                     
+                except MemoryBudgetExceeded:
+                    raise
                 except requests.exceptions.Timeout:
                     console.print(f"[yellow]  第 {attempt + 1} 次尝试超时[/yellow]")
                     if attempt == max_retries - 1:
@@ -164,12 +900,9 @@ class ProxyConverter:
         lines = content.strip().split('\n')
         if lines:
             first_line = lines[0].strip()
-            if first_line.startswith('ss://'):
-                return 'shadowsocks'
-            elif first_line.startswith('vmess://'):
-                return 'v2ray_uri'
-            elif first_line.startswith('trojan://'):
-                return 'trojan'
+            scheme, sep, _ = first_line.partition('://')
+            if sep and scheme.lower() in self.scheme_parsers:
+                return self.scheme_parsers[scheme.lower()]['format']
         
         # 检测 Base64 编码的内容
         try:
@@ -179,12 +912,9 @@ class ProxyConverter:
                 lines = decoded.strip().split('\n')
                 if lines:
                     first_line = lines[0].strip()
-                    if first_line.startswith('ss://'):
-                        return 'shadowsocks'
-                    elif first_line.startswith('vmess://'):
-                        return 'v2ray_uri'
-                    elif first_line.startswith('trojan://'):
-                        return 'trojan'
+                    scheme, sep, _ = first_line.partition('://')
+                    if sep and scheme.lower() in self.scheme_parsers:
+                        return self.scheme_parsers[scheme.lower()]['format']
         except:
             pass
         
@@ -237,23 +967,180 @@ class ProxyConverter:
                 decoded = base64.b64decode(encoded).decode('utf-8')
                 config = json.loads(decoded)
                 
-                return {
-                    'name': config.get('ps', 'VMess Node'),
-                    'type': 'vmess',
-                    'server': config.get('add'),
-                    'port': int(config.get('port', 443)),
-                    'uuid': config.get('id'),
-                    'alterId': int(config.get('aid', 0)),
-                    'cipher': config.get('scy', 'auto'),
-                    'network': config.get('net', 'tcp'),
-                    'tls': config.get('tls') == 'tls',
-                    'path': config.get('path', ''),
-                    'host': config.get('host', '')
-                }
+                return self._vmess_node(config)
         except Exception as e:
             console.print(f"[red]解析 VMess URI 失败: {e}[/red]")
         return None
     
+    def _vmess_node(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """将 vmess:// 中的 JSON 配置转换为节点"""
+        return {
+            'name': config.get('ps', 'VMess Node'),
+            'type': 'vmess',
+            'server': config.get('add'),
+            'port': int(config.get('port', 443)),
+            'uuid': config.get('id'),
+            'alterId': int(config.get('aid', 0)),
+            'cipher': config.get('scy', 'auto'),
+            'network': config.get('net', 'tcp'),
+            'tls': config.get('tls') == 'tls',
+            'path': config.get('path', ''),
+            'host': config.get('host', '')
+        }
+    
+    def parse_vmess_batch(self, uris: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """批量解析 VMess URI
+        
+        每行独立解码，坏行只影响自身；解码失败的行交给 parse_vmess_uri 输出具体错误。
+        """
+        nodes = []
+        for uri in uris:
+            node = None
+            try:
+                config = json.loads(base64.b64decode(uri[8:]).decode('utf-8'))
+                if isinstance(config, dict) and uri.startswith('vmess://'):
+                    node = self._vmess_node(config)
+            except Exception:
+                pass
+            nodes.append(node if node else self.parse_vmess_uri(uri))
+        return nodes
+    
+    def _parse_transport_params(self, node: Dict[str, Any], query: Dict[str, List[str]], sni_key: str):
+        """解析 trojan/vless URI 中的 TLS 和传输层参数，字段名与 Clash 配置一致"""
+        def param(key: str, default: str = '') -> str:
+            return query.get(key, [default])[0]
+        
+        sni = param('sni') or param('peer')
+        if sni:
+            node[sni_key] = sni
+        if param('allowInsecure') in ('1', 'true'):
+            node['skip-cert-verify'] = True
+        if param('fp'):
+            node['client-fingerprint'] = param('fp')
+        
+        network = param('type', 'tcp')
+        if network != 'tcp':
+            node['network'] = network
+        if network == 'ws':
+            ws_opts = {'path': param('path') or '/'}
+            if param('host'):
+                ws_opts['headers'] = {'Host': param('host')}
+            node['ws-opts'] = ws_opts
+        elif network == 'grpc' and param('serviceName'):
+            node['grpc-opts'] = {'grpc-service-name': param('serviceName')}
+    
+    def parse_trojan_uri(self, uri: str) -> Dict[str, Any]:
+        """解析 Trojan URI"""
+        try:
+            # trojan://password@server:port?sni=...&type=ws&path=...#name
+            parsed = urlparse(uri)
+            if parsed.scheme == 'trojan' and parsed.hostname and parsed.username:
+                node = {
+                    'name': unquote(parsed.fragment) or 'Trojan Node',
+                    'type': 'trojan',
+                    'server': parsed.hostname,
+                    'port': parsed.port or 443,
+                    'password': unquote(parsed.username),
+                    'udp': True
+                }
+                self._parse_transport_params(node, parse_qs(parsed.query), 'sni')
+                return node
+        except Exception as e:
+            console.print(f"[red]解析 Trojan URI 失败: {e}[/red]")
+        return None
+    
+    def parse_vless_uri(self, uri: str) -> Dict[str, Any]:
+        """解析 VLESS URI"""
+        try:
+            # vless://uuid@server:port?encryption=none&security=tls&type=ws&flow=...#name
+            parsed = urlparse(uri)
+            if parsed.scheme == 'vless' and parsed.hostname and parsed.username:
+                query = parse_qs(parsed.query)
+                security = query.get('security', [''])[0]
+                node = {
+                    'name': unquote(parsed.fragment) or 'VLESS Node',
+                    'type': 'vless',
+                    'server': parsed.hostname,
+                    'port': parsed.port or 443,
+                    'uuid': unquote(parsed.username),
+                    'tls': security in ('tls', 'reality'),
+                    'udp': True
+                }
+                if query.get('flow', [''])[0]:
+                    node['flow'] = query['flow'][0]
+                self._parse_transport_params(node, query, 'servername')
+                if security == 'reality':
+                    node['reality-opts'] = {
+                        'public-key': query.get('pbk', [''])[0],
+                        'short-id': query.get('sid', [''])[0]
+                    }
+                return node
+        except Exception as e:
+            console.print(f"[red]解析 VLESS URI 失败: {e}[/red]")
+        return None
+    
+    def register_scheme_parser(self, scheme: str, parser, label: Optional[str] = None, batch: bool = False,
+                               format_name: Optional[str] = None):
+        """注册 URI 协议解析器
+        
+        parser 默认逐行调用 (uri -> 节点或 None)；batch 为 True 时每次接收同一协议的
+        一批行 (List[uri] -> List[节点或 None])，可在内部批量解码。
+        format_name 为 detect_format 对该协议返回的格式名，默认与协议名相同。
+        """
+        self.scheme_parsers[scheme.lower()] = {
+            'label': label or scheme,
+            'parser': parser,
+            'batch': batch,
+            'format': format_name or scheme.lower()
+        }
+    
+    def _parse_scheme_batch(self, scheme: str, lines: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """解码同一协议的一批 URI，并累计该协议的吞吐统计"""
+        entry = self.scheme_parsers[scheme]
+        parser = entry['parser']
+        results = []
+        start = time.perf_counter()
+        # 分块解码，每块之前检查内存预算 (节点字典在这一步产生)
+        for offset in range(0, len(lines), self.PARSE_CHUNK):
+            self.memory.check('parse_subscription_content')
+            chunk = lines[offset:offset + self.PARSE_CHUNK]
+            if entry['batch']:
+                results.extend(parser(chunk))
+            else:
+                results.extend(parser(line) for line in chunk)
+        elapsed = time.perf_counter() - start
+        
+        stat = self.scheme_stats.setdefault(scheme, {'label': entry['label'], 'lines': 0, 'nodes': 0, 'seconds': 0.0})
+        stat['lines'] += len(lines)
+        stat['nodes'] += sum(1 for node in results if node)
+        stat['seconds'] += elapsed
+        return results
+    
+    def report_scheme_stats(self):
+        """输出各协议解析吞吐"""
+        if not self.scheme_stats:
+            return
+        
+        table = Table(show_header=True, header_style="bold magenta", title="协议解析统计")
+        table.add_column("协议")
+        table.add_column("行数", justify="right")
+        table.add_column("有效节点", justify="right")
+        table.add_column("耗时 (ms)", justify="right")
+        table.add_column("行/秒", justify="right")
+        
+        for stat in self.scheme_stats.values():
+            rate = stat['lines'] / stat['seconds'] if stat['seconds'] else 0
+            table.add_row(
+                stat['label'],
+                str(stat['lines']),
+                str(stat['nodes']),
+                f"{stat['seconds'] * 1000:.1f}",
+                f"{rate:,.0f}"
+            )
+        
+        console.print(table)
+    
+    @memory_stage('parse_subscription_content')
     def parse_subscription_content(self, content: str) -> List[Dict[str, Any]]:
         """解析订阅内容"""
         format_type = self.detect_format(content)
@@ -265,6 +1152,7 @@ class ProxyConverter:
         if format_type == 'clash':
             try:
                 data = yaml.safe_load(content)
+                self.memory.check('parse_subscription_content')
                 console.print(f"[green]成功解析YAML，键: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}[/green]")
                 
                 if isinstance(data, dict) and 'proxies' in data:
@@ -285,13 +1173,24 @@ class ProxyConverter:
                             nodes = data
                             console.print(f"[green]内容本身是节点列表，包含 {len(nodes)} 个节点[/green]")
                 
+            except MemoryBudgetExceeded:
+                raise
             except Exception as e:
                 console.print(f"[red]解析 Clash 配置失败: {e}[/red]")
                 # 尝试作为纯文本处理
                 console.print("[yellow]尝试作为纯文本URI处理...[/yellow]")
                 format_type = 'text_uri'
+            
+            if nodes and self.name_filter:
+                kept = []
+                for node in nodes:
+                    if isinstance(node, dict) and self.name_filter.accepts(str(node.get('name', ''))):
+                        kept.append(node)
+                self.name_filter.rename_nodes(kept)
+                nodes = kept
         
-        if format_type in ['shadowsocks', 'v2ray_uri', 'trojan', 'text_uri', 'unknown']:
+        uri_formats = {entry['format'] for entry in self.scheme_parsers.values()}
+        if format_type in uri_formats or format_type in ['text_uri', 'unknown']:
             # 首先尝试Base64解码
             original_content = content
             try:
@@ -306,32 +1205,112 @@ class ProxyConverter:
             lines = content.strip().split('\n')
             console.print(f"[cyan]处理 {len(lines)} 行内容[/cyan]")
             
+            # 按协议头分桶 (保留原始行号)，之后每个协议批量解码
+            self.scheme_stats = {}
+            buckets: Dict[str, List[Tuple[int, str, bool]]] = {}
+            unsupported: Dict[str, int] = {}
             for i, line in enumerate(lines):
+                if i % 1000 == 0:
+                    self.memory.check('parse_subscription_content')
+                
                 line = line.strip()
-                if not line:
+                scheme, sep, _ = line.partition('://')
+                if not sep:
+                    continue
+                scheme = scheme.lower()
+                if scheme not in self.scheme_parsers:
+                    unsupported[scheme] = unsupported.get(scheme, 0) + 1
                     continue
                 
-                console.print(f"[dim]处理第 {i+1} 行: {line[:50]}...[/dim]")
+                # 名称在 # 之后的 URI 可以在解码前先做过滤
+                name_checked = False
+                if self.name_filter and '#' in line:
+                    if not self.name_filter.accepts(unquote(line.partition('#')[2])):
+                        continue
+                    name_checked = True
                 
-                if line.startswith('ss://'):
-                    node = self.parse_shadowsocks_uri(line)
-                    if node:
-                        nodes.append(node)
-                        console.print(f"[green]✅ 解析SS节点: {node.get('name', 'Unknown')}[/green]")
-                elif line.startswith('vmess://'):
-                    node = self.parse_vmess_uri(line)
-                    if node:
-                        nodes.append(node)
-                        console.print(f"[green]✅ 解析VMess节点: {node.get('name', 'Unknown')}[/green]")
-                elif line.startswith('trojan://'):
-                    console.print(f"[yellow]发现Trojan节点但暂不支持解析[/yellow]")
+                buckets.setdefault(scheme, []).append((i, line, name_checked))
+            
+            for scheme, count in unsupported.items():
+                console.print(f"[yellow]发现 {count} 个 {scheme}:// 节点但暂不支持解析[/yellow]")
+            
+            parsed = []
+            for scheme, entries in buckets.items():
+                results = self._parse_scheme_batch(scheme, [line for _, line, _ in entries])
+                count = 0
+                for (i, _, name_checked), node in zip(entries, results):
+                    if not node:
+                        continue
+                    if self.name_filter:
+                        if not name_checked and not self.name_filter.accepts(node['name']):
+                            continue
+                    parsed.append((i, node))
+                    count += 1
+                console.print(f"[green]✅ 解析{self.scheme_parsers[scheme]['label']}节点: {count} 个[/green]")
+            
+            parsed.sort(key=lambda item: item[0])
+            nodes.extend(node for _, node in parsed)
+            if self.name_filter:
+                # 按原始行序重命名，重名后缀的分配与协议分桶顺序无关
+                self.name_filter.rename_nodes(nodes)
+            self.report_scheme_stats()
         
+        if self.name_filter:
+            self.name_filter.report()
         console.print(f"[bold green]总共解析到 {len(nodes)} 个有效节点[/bold green]")
         return nodes
     
-    def convert_to_clash(self, nodes: List[Dict[str, Any]]) -> str:
-        """转换为 Clash 格式"""
-        clash_config = {
+    @memory_stage('resolve_nodes')
+    def resolve_nodes(self, nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """解析节点域名，结果写入节点的 resolved_ips 字段"""
+        lookups, hits = self.resolver.lookups, self.resolver.cache_hits
+        self.resolver.resolve_nodes(nodes)
+        unresolved = sum(1 for node in nodes if not node['resolved_ips'])
+        console.print(f"[green]域名解析完成: 查询 {self.resolver.lookups - lookups} 个域名，"
+                      f"缓存命中 {self.resolver.cache_hits - hits} 个，{unresolved} 个节点未解析到地址[/green]")
+        return nodes
+    
+    def _cached_render(self, target: str, nodes: List[Dict[str, Any]], render, **options) -> str:
+        """带缓存的渲染: 相同节点、格式和选项直接返回已有结果
+        
+        options 只参与缓存键计算，影响输出的参数需由 render 自行绑定。
+        """
+        key = OutputCache.make_key(nodes, target, **options)
+        cached = self.output_cache.get(key)
+        if cached is not None:
+            console.print(f"[dim]命中转换缓存 ({target})[/dim]")
+            return cached
+        
+        output = render(nodes)
+        self.output_cache.put(key, output)
+        return output
+    
+    @memory_stage('convert_to_clash')
+    def convert_to_clash(self, nodes: List[Dict[str, Any]], region_groups: bool = False) -> str:
+        """转换为 Clash 格式
+        
+        region_groups 为 True 时按地区额外生成 url-test 分组。
+        """
+        if not region_groups:
+            return self._cached_render('clash', nodes, self._render_clash)
+        return self._cached_render(
+            'clash', nodes, functools.partial(self._render_clash, region_groups=True),
+            region_groups=True, region_db=self.region_index.fingerprint
+        )
+    
+    @memory_stage('convert_to_shadowsocks')
+    def convert_to_shadowsocks(self, nodes: List[Dict[str, Any]]) -> str:
+        """转换为 Shadowsocks URI 格式"""
+        return self._cached_render('shadowsocks', nodes, self._render_shadowsocks)
+    
+    @memory_stage('convert_to_v2ray')
+    def convert_to_v2ray(self, nodes: List[Dict[str, Any]]) -> str:
+        """转换为 V2Ray 订阅格式"""
+        return self._cached_render('v2ray', nodes, self._render_v2ray)
+    
+    def _clash_base_config(self) -> Dict[str, Any]:
+        """Clash 配置的公共部分 (不含节点)"""
+        return {
             'port': 7890,
             'socks-port': 7891,
             'allow-lan': False,
@@ -363,48 +1342,219 @@ class ProxyConverter:
                 'MATCH,🚀 节点选择'
             ]
         }
+    
+    def _to_clash_proxy(self, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """将单个节点转换为 Clash 代理条目，不支持的类型返回 None"""
+        if node['type'] == 'ss':
+            return {
+                'name': node['name'],
+                'type': 'ss',
+                'server': node['server'],
+                'port': node['port'],
+                'cipher': node['cipher'],
+                'password': node['password']
+            }
+        
+        elif node['type'] == 'vmess':
+            clash_node = {
+                'name': node['name'],
+                'type': 'vmess',
+                'server': node['server'],
+                'port': node['port'],
+                'uuid': node['uuid'],
+                'alterId': node['alterId'],
+                'cipher': node['cipher'],
+                'network': node['network']
+            }
+            
+            if node.get('tls'):
+                clash_node['tls'] = True
+            if node.get('path'):
+                clash_node['ws-path'] = node['path']
+            if node.get('host'):
+                clash_node['ws-headers'] = {'Host': node['host']}
+            
+            return clash_node
+        
+        elif node['type'] in ('trojan', 'vless'):
+            # URI 解析结果和 Clash 输入的字段均为 Clash 格式，原样保留
+            return {key: value for key, value in node.items() if key not in INTERNAL_NODE_KEYS}
+        
+        return None
+    
+    def _fill_clash_groups(self, groups: List[Dict[str, Any]], names: List[str],
+                           regions: Optional[List[str]] = None):
+        """把节点名称填入策略组，regions 不为空时按地区生成 url-test 分组"""
+        groups[0]['proxies'].extend(names)
+        groups[1]['proxies'].extend(names)
+        if regions is None:
+            return
+        
+        by_region: Dict[str, List[str]] = {}
+        for name, region in zip(names, regions):
+            by_region.setdefault(region, []).append(name)
+        
+        # 分组名与节点名共用命名空间，重名时 Clash 会拒绝配置
+        taken = set(names) | {group['name'] for group in groups} | {'DIRECT', 'REJECT'}
+        region_groups = []
+        for region in sorted(by_region, key=lambda r: (r == 'OTHER', r)):
+            group_name = REGION_NAMES.get(region, region)
+            if group_name in taken:
+                base_name = f"{group_name} 分组"
+                group_name = base_name
+                suffix = 2
+                while group_name in taken:
+                    group_name = f"{base_name} {suffix}"
+                    suffix += 1
+            taken.add(group_name)
+            region_groups.append({
+                'name': group_name,
+                'type': 'url-test',
+                'proxies': by_region[region],
+                'url': 'http://www.gstatic.com/generate_204',
+                'interval': 300
+            })
+        # 地区分组排在自动选择之后、DIRECT 和单个节点之前
+        groups[0]['proxies'][1:1] = [group['name'] for group in region_groups]
+        groups.extend(region_groups)
+    
+    def _render_clash(self, nodes: List[Dict[str, Any]], region_groups: bool = False) -> str:
+        """生成 Clash 配置"""
+        if self.memory.check('convert_to_clash', can_stream=True,
+                             extra_bytes=len(nodes) * self.CLASH_BYTES_PER_NODE):
+            return self._render_clash_streaming(nodes, region_groups)
+        
+        clash_config = self._clash_base_config()
+        names = []
+        regions = [] if region_groups else None
         
         for node in nodes:
-            if node['type'] == 'ss':
-                clash_node = {
-                    'name': node['name'],
-                    'type': 'ss',
-                    'server': node['server'],
-                    'port': node['port'],
-                    'cipher': node['cipher'],
-                    'password': node['password']
-                }
+            clash_node = self._to_clash_proxy(node)
+            if clash_node:
                 clash_config['proxies'].append(clash_node)
-                clash_config['proxy-groups'][0]['proxies'].append(node['name'])
-                clash_config['proxy-groups'][1]['proxies'].append(node['name'])
-            
-            elif node['type'] == 'vmess':
-                clash_node = {
-                    'name': node['name'],
-                    'type': 'vmess',
-                    'server': node['server'],
-                    'port': node['port'],
-                    'uuid': node['uuid'],
-                    'alterId': node['alterId'],
-                    'cipher': node['cipher'],
-                    'network': node['network']
-                }
+                names.append(node['name'])
+                if region_groups:
+                    regions.append(self.region_index.classify(node))
+        
+        self._fill_clash_groups(clash_config['proxy-groups'], names, regions)
+        return yaml.dump(clash_config, default_flow_style=False, allow_unicode=True)
+    
+    def _render_clash_streaming(self, nodes: List[Dict[str, Any]], region_groups: bool = False) -> str:
+        """分批生成 Clash 配置
+        
+        输出与 _render_clash 一致，但节点按批转换和序列化，
+        避免一次性为全部节点构建 YAML 节点树。
+        """
+        clash_config = self._clash_base_config()
+        del clash_config['proxies']
+        names = []
+        regions = [] if region_groups else None
+        
+        buffer = io.StringIO()
+        # yaml.dump 默认按键排序，proxies 需要插在对应位置
+        head = {k: v for k, v in clash_config.items() if k < 'proxies'}
+        tail = {k: v for k, v in clash_config.items() if k > 'proxies'}
+        yaml.dump(head, buffer, default_flow_style=False, allow_unicode=True)
+        
+        chunk = []
+        wrote_header = False
+        for index, node in enumerate(nodes):
+            clash_node = self._to_clash_proxy(node)
+            if clash_node:
+                chunk.append(clash_node)
+                names.append(node['name'])
+                if region_groups:
+                    regions.append(self.region_index.classify(node))
+            if chunk and (len(chunk) >= self.CLASH_STREAM_CHUNK or index == len(nodes) - 1):
+                if not wrote_header:
+                    buffer.write('proxies:\n')
+                    wrote_header = True
+                yaml.dump(chunk, buffer, default_flow_style=False, allow_unicode=True)
+                chunk = []
+        if not wrote_header:
+            buffer.write('proxies: []\n')
+        
+        self._fill_clash_groups(tail['proxy-groups'], names, regions)
+        yaml.dump(tail, buffer, default_flow_style=False, allow_unicode=True)
+        return buffer.getvalue()
+    
+    def _shard_key(self, node: Dict[str, Any], shard_by: str) -> str:
+        """计算节点所属的分片名"""
+        if shard_by == 'provider':
+            return node.get('provider') or 'default'
+        elif shard_by == 'region':
+            return self.region_index.classify(node)
+        return 'shard'
+    
+    @memory_stage('convert_to_clash_providers')
+    def convert_to_clash_providers(self, nodes: List[Dict[str, Any]], shard_by: str = 'provider',
+                                   shard_size: int = 500, providers_dir: str = 'providers') -> Dict[str, str]:
+        """转换为 Clash proxy-providers 分片格式
+        
+        返回 {相对路径: 文件内容}，其中 clash_config.yaml 为主配置，
+        节点按 provider/region/size 分片写入 providers_dir 下的独立文件，
+        单个分片超过 shard_size 个节点时继续拆分。
+        """
+        if shard_by not in ('provider', 'region', 'size'):
+            raise ValueError(f"不支持的分片方式: {shard_by}")
+        if not isinstance(shard_size, int) or shard_size <= 0:
+            raise ValueError(f"分片大小必须为正整数: {shard_size}")
+        
+        shards: Dict[str, List[Dict[str, Any]]] = {}
+        for node in nodes:
+            clash_node = self._to_clash_proxy(node)
+            if clash_node:
+                shards.setdefault(self._shard_key(node, shard_by), []).append(clash_node)
+        
+        files = {}
+        providers = {}
+        # 按小写记录已用名称，避免在大小写不敏感的文件系统上互相覆盖
+        used_names = set()
+        for key, proxies in shards.items():
+            safe_key = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in key).strip('._') or 'default'
+            for offset in range(0, len(proxies), shard_size):
+                if len(proxies) > shard_size:
+                    provider_name = f"{safe_key}_{offset // shard_size + 1:03d}"
+                else:
+                    provider_name = safe_key
                 
-                if node.get('tls'):
-                    clash_node['tls'] = True
-                if node.get('path'):
-                    clash_node['ws-path'] = node['path']
-                if node.get('host'):
-                    clash_node['ws-headers'] = {'Host': node['host']}
+                # 不同分片清洗后或拆分编号后可能重名 (如 "x_001" 与拆分后的 "x")
+                base_name = provider_name
+                suffix = 2
+                while provider_name.lower() in used_names:
+                    provider_name = f"{base_name}-{suffix}"
+                    suffix += 1
+                used_names.add(provider_name.lower())
                 
-                clash_config['proxies'].append(clash_node)
-                clash_config['proxy-groups'][0]['proxies'].append(node['name'])
-                clash_config['proxy-groups'][1]['proxies'].append(node['name'])
+                path = f"{providers_dir}/{provider_name}.yaml"
+                files[path] = yaml.dump(
+                    {'proxies': proxies[offset:offset + shard_size]},
+                    default_flow_style=False, allow_unicode=True
+                )
+                providers[provider_name] = {
+                    'type': 'file',
+                    'path': f"./{path}",
+                    'health-check': {
+                        'enable': True,
+                        'url': 'http://www.gstatic.com/generate_204',
+                        'interval': 300
+                    }
+                }
         
-        return yaml.dump(clash_config, default_flow_style=False, allow_unicode=True)
+        clash_config = self._clash_base_config()
+        del clash_config['proxies']
+        clash_config['proxy-providers'] = providers
+        clash_config['proxy-groups'][0]['use'] = list(providers)
+        clash_config['proxy-groups'][1]['use'] = list(providers)
+        del clash_config['proxy-groups'][1]['proxies']
+        
+        output = {'clash_config.yaml': yaml.dump(clash_config, default_flow_style=False, allow_unicode=True)}
+        output.update(files)
+        return output
     
-    def convert_to_shadowsocks(self, nodes: List[Dict[str, Any]]) -> str:
-        """转换为 Shadowsocks URI 格式"""
+    def _render_shadowsocks(self, nodes: List[Dict[str, Any]]) -> str:
+        """生成 Shadowsocks 订阅"""
+        self.memory.check('convert_to_shadowsocks')
         uris = []
         for node in nodes:
             if node['type'] == 'ss':
@@ -416,8 +1566,9 @@ class ProxyConverter:
         
         return base64.b64encode('\n'.join(uris).encode()).decode()
     
-    def convert_to_v2ray(self, nodes: List[Dict[str, Any]]) -> str:
-        """转换为 V2Ray 订阅格式"""
+    def _render_v2ray(self, nodes: List[Dict[str, Any]]) -> str:
+        """生成 V2Ray 订阅"""
+        self.memory.check('convert_to_v2ray')
         uris = []
         for node in nodes:
             if node['type'] == 'vmess':
@@ -483,7 +1634,8 @@ def show_supported_formats():
     table.add_row("VMess", "vmess:// URI, Base64", "vmess:// URI, Base64, Clash", "✅ 支持")
     table.add_row("Clash", "YAML 配置文件", "YAML, ss://, vmess://", "✅ 支持")
     table.add_row("V2Ray", "JSON 配置, vmess://", "vmess://, Clash", "✅ 支持")
-    table.add_row("Trojan", "trojan:// URI", "Clash", "🚧 开发中")
+    table.add_row("Trojan", "trojan:// URI, Base64", "Clash", "✅ 支持")
+    table.add_row("VLESS", "vless:// URI, Base64", "Clash (Meta)", "✅ 支持")
     table.add_row("Surge", "配置文件", "Clash", "🚧 开发中")
     
     console.print("\n")
@@ -492,7 +1644,40 @@ def show_supported_formats():
 
 def convert_subscription():
     """订阅转换功能"""
-    converter = ProxyConverter()
+    # 可通过 HULINK_REGION_DB 指定本地 IP 段地区数据文件，
+    # HULINK_CACHE_DIR 指定转换结果的磁盘缓存目录，多次运行之间可复用，
+    # HULINK_MEMORY_PROFILE=1 开启分阶段内存统计，
+    # HULINK_MEMORY_BUDGET_MB / HULINK_MEMORY_ON_EXCEED (abort/stream) 设置内存预算，
+    # HULINK_FILTER_INFO=1 过滤流量/到期信息节点，HULINK_NAME_INCLUDE / HULINK_NAME_EXCLUDE 为名称正则，
+    # HULINK_RESOLVE_DNS=1 允许在地区分组前通过系统 DNS 解析节点域名 (默认不访问网络)
+    resolve_dns = os.environ.get('HULINK_RESOLVE_DNS', '') in ('1', 'true', 'yes')
+    memory_budget_mb = None
+    if os.environ.get('HULINK_MEMORY_BUDGET_MB'):
+        try:
+            memory_budget_mb = float(os.environ['HULINK_MEMORY_BUDGET_MB'])
+        except ValueError:
+            console.print("[yellow]HULINK_MEMORY_BUDGET_MB 不是有效数字，已忽略[/yellow]")
+    
+    try:
+        exclude = []
+        if os.environ.get('HULINK_FILTER_INFO', '') in ('1', 'true', 'yes'):
+            exclude.extend(NameFilter.INFO_PATTERNS)
+        if os.environ.get('HULINK_NAME_EXCLUDE'):
+            exclude.append(os.environ['HULINK_NAME_EXCLUDE'])
+        include = [os.environ['HULINK_NAME_INCLUDE']] if os.environ.get('HULINK_NAME_INCLUDE') else []
+        name_filter = NameFilter(include=include, exclude=exclude) if include or exclude else None
+        
+        converter = ProxyConverter(
+            name_filter=name_filter,
+            region_db=os.environ.get('HULINK_REGION_DB'),
+            cache_dir=os.environ.get('HULINK_CACHE_DIR'),
+            memory_profile=os.environ.get('HULINK_MEMORY_PROFILE', '') in ('1', 'true', 'yes'),
+            memory_budget_mb=memory_budget_mb,
+            memory_on_exceed=os.environ.get('HULINK_MEMORY_ON_EXCEED', 'abort')
+        )
+    except (OSError, ValueError) as e:
+        console.print(f"[red]初始化失败: {e}[/red]")
+        return
     
     # 获取订阅链接
     url = Prompt.ask("\n[bold cyan]请输入订阅链接[/bold cyan]")
@@ -520,6 +1705,11 @@ def convert_subscription():
         
         console.print(f"[green]成功解析 {len(nodes)} 个节点[/green]")
         
+        # 记录节点来源，供按 provider 分片使用
+        provider = urlparse(url).hostname or 'default'
+        for node in nodes:
+            node.setdefault('provider', provider)
+        
         # 显示节点信息
         table = Table(show_header=True, header_style="bold magenta")
         table.add_column("序号", width=6)
@@ -549,14 +1739,40 @@ def convert_subscription():
         console.print("1. Clash YAML")
         console.print("2. Shadowsocks Base64")
         console.print("3. V2Ray Base64")
+        console.print("4. Clash proxy-providers 分片")
         
-        choice = Prompt.ask("请输入选项 (1-3)", choices=["1", "2", "3"])
+        choice = Prompt.ask("请输入选项 (1-4)", choices=["1", "2", "3", "4"])
+        
+        if choice == "4":
+            shard_by = Prompt.ask("分片方式", choices=["provider", "region", "size"], default="provider")
+            if shard_by == "region" and resolve_dns and len(converter.region_index):
+                converter.resolve_nodes(nodes)
+            files = converter.convert_to_clash_providers(nodes, shard_by=shard_by)
+            output_dir = "clash_providers"
+            console.print(f"[green]生成主配置和 {len(files) - 1} 个节点分片[/green]")
+            
+            if Confirm.ask(f"\n是否保存到目录 {output_dir}?"):
+                for path, file_content in files.items():
+                    full_path = os.path.join(output_dir, path)
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    with open(full_path, 'w', encoding='utf-8') as f:
+                        f.write(file_content)
+                console.print(f"[green]已保存到 {output_dir}/[/green]")
+            
+            if Confirm.ask("是否显示主配置预览?"):
+                console.print("\n[bold yellow]主配置预览:[/bold yellow]")
+                console.print(Panel(files['clash_config.yaml'], border_style="yellow"))
+            converter.memory.report()
+            return
         
         output_content = ""
         output_filename = ""
         
         if choice == "1":
-            output_content = converter.convert_to_clash(nodes)
+            region_groups = Confirm.ask("是否按地区生成节点分组?", default=False)
+            if region_groups and resolve_dns and len(converter.region_index):
+                converter.resolve_nodes(nodes)
+            output_content = converter.convert_to_clash(nodes, region_groups=region_groups)
             output_filename = "clash_config.yaml"
         elif choice == "2":
             output_content = converter.convert_to_shadowsocks(nodes)
@@ -576,6 +1792,8 @@ def convert_subscription():
             preview = output_content[:500] + "..." if len(output_content) > 500 else output_content
             console.print("\n[bold yellow]转换结果预览:[/bold yellow]")
             console.print(Panel(preview, border_style="yellow"))
+        
+        converter.memory.report()
     
     except Exception as e:
         console.print(f"[red]转换失败: {str(e)}[/red]")